@@ -1,18 +1,75 @@
-import google.generativeai as genai
 import os
 import json
 import base64
 
-# Configure Gemini
-# Ideally this comes from env vars, but we'll check os.environ in the function or global scope
-# genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# google.generativeai is slow to import, so it is loaded and configured on first use
+_genai = None
+
+# Optional replacement for the Gemini model (offline stubs, recorded responses)
+_model_factory = None
+
+def set_model_factory(factory):
+    """
+    Makes the analysis functions use factory() instead of a Gemini model; None restores Gemini.
+    The returned object only needs generate_content(contents, generation_config=None)
+    returning something with a .text attribute.
+    """
+    global _model_factory
+    _model_factory = factory
+
+def _get_model():
+    """
+    Returns the model used by the analysis functions (Gemini unless overridden).
+    """
+    if _model_factory is not None:
+        return _model_factory()
+    return gemini_model()
+
+def gemini_model():
+    """
+    Returns a Gemini model, importing and configuring the SDK on the first call.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+        else:
+            print("WARNING: GEMINI_API_KEY not found in environment variables.")
+        _genai = genai
+    return _genai.GenerativeModel(MODEL_NAME)
+
+def format_digest(digest: dict) -> str:
+    """
+    Renders a features.window_digest as a few compact prompt lines.
+    """
+    def ago(bars):
+        return f"{bars} bars ago" if bars is not None else "none in window"
+
+    return (
+        f"Bars: {digest['bars']}, Close: {digest['close']} ({digest['change_pct']:+}% over window)\n"
+        f"Window: High={digest['window_high']}, Low={digest['window_low']}, "
+        f"Close at {int(digest['window_position'] * 100)}% of range\n"
+        f"Volatility: ATR(14)={digest['atr']} (window avg {digest['atr_window_avg']}), 20-bar range={digest['rolling_range']}\n"
+        f"Dealing Range: PO3={digest['po3_size']}, Close at {int(digest['dr_position'] * 100)}% "
+        f"({'Premium' if digest['dr_position'] > 0.5 else 'Discount'})\n"
+        f"Swings: last high {digest['last_swing_high']} ({ago(digest['last_swing_high_bars_ago'])}), "
+        f"last low {digest['last_swing_low']} ({ago(digest['last_swing_low_bars_ago'])}), "
+        f"{digest['swing_highs']} highs / {digest['swing_lows']} lows in window\n"
+        f"Gaps (FVG): {digest['bullish_gaps']} bullish / {digest['bearish_gaps']} bearish, "
+        f"most recent {ago(digest['last_gap_bars_ago'])}\n"
+    )
 
 def compile_strategy(pdf_text: str) -> dict:
     """
     Takes raw text from a PDF and asks Gemini to create a "Persona" or "Lens".
     Returns a dict with 'persona' (system prompt) and 'label' (one-word name).
     """
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    model = _get_model()
 
     prompt = f"""
     You are an expert financial analyst. I am going to give you a trading strategy document.
@@ -45,17 +102,23 @@ def compile_strategy(pdf_text: str) -> dict:
             "persona": "You are a generic technical analyst. Analyze the chart for trends and support/resistance."
         }
 
-def analyze_chart(chart_data: list, strategy_persona: str, chart_screenshot: str = None) -> dict:
+def analyze_chart(chart_data: list, strategy_persona: str, chart_screenshot: str = None, digest: dict = None) -> dict:
     """
     Sends chart data and the strategy persona to Gemini to get a narrative.
     If a screenshot is provided, uses multimodal analysis.
+    If a digest (features.window_digest) is provided, the prompt summarizes the
+    whole window with it and only lists the last few candles raw.
+    When the AI call fails, a NEUTRAL fallback is returned with an "error" key.
     """
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    model = _get_model()
 
     # Summarize chart data to save tokens/make it readable
+    recent = 5 if digest else 20
     chart_summary = ""
-    for i, candle in enumerate(chart_data[-20:]): # Look at last 20 candles closely
-        chart_summary += f"T-{20-i}: Open={candle['open']}, High={candle['high']}, Low={candle['low']}, Close={candle['close']}\n"
+    if digest:
+        chart_summary += f"WINDOW DIGEST:\n{format_digest(digest)}\nLAST {recent} CANDLES:\n"
+    for i, candle in enumerate(chart_data[-recent:]): # Look at the most recent candles closely
+        chart_summary += f"T-{recent-i}: Open={candle['open']}, High={candle['high']}, Low={candle['low']}, Close={candle['close']}\n"
 
     prompt = f"""
     {strategy_persona}
@@ -65,7 +128,7 @@ def analyze_chart(chart_data: list, strategy_persona: str, chart_screenshot: str
     {"The image shows the actual chart with price levels marked." if chart_screenshot else ""}
     Identify ONE key insight or setup based on your strategy.
 
-    MARKET DATA (last 20 candles):
+    MARKET DATA:
     {chart_summary}
 
     OUTPUT FORMAT (JSON):
@@ -115,22 +178,24 @@ def analyze_chart(chart_data: list, strategy_persona: str, chart_screenshot: str
                 "narrative": "API rate limit exceeded. Please wait a moment and try again.",
                 "key_level": None,
                 "reasoning": "The AI service is temporarily unavailable due to rate limiting.",
-                "confidence": 0
+                "confidence": 0,
+                "error": str(e)[:200]
             }
         return {
             "sentiment": "NEUTRAL",
             "narrative": "Analysis temporarily unavailable. Please try again.",
             "key_level": None,
             "reasoning": f"AI analysis error: {str(e)[:100]}",
-            "confidence": 0
+            "confidence": 0,
+            "error": str(e)[:200]
         }
 
-def analyze_chart_with_goldbach(chart_data: list, goldbach_result: dict, chart_screenshot: str = None) -> dict:
+def analyze_chart_with_goldbach(chart_data: list, goldbach_result: dict, chart_screenshot: str = None, digest: dict = None) -> dict:
     """
     Analyzes chart using Goldbach strategy with multimodal Gemini.
     Combines the mathematical Goldbach analysis with AI vision analysis of the chart.
     """
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    model = _get_model()
 
     # Get the Goldbach analysis context
     dealing_range = goldbach_result.get('dealing_range', {})
@@ -157,6 +222,8 @@ def analyze_chart_with_goldbach(chart_data: list, goldbach_result: dict, chart_s
     DETECTED PATTERNS:
 {signals_context if signals_context else '  - No special patterns detected'}
 
+    {"WINDOW DIGEST:" + chr(10) + format_digest(digest) if digest else ""}
+
     {"The attached image shows the chart with Goldbach levels marked as horizontal lines." if chart_screenshot else ""}
 
     TASK:
@@ -216,5 +283,6 @@ def analyze_chart_with_goldbach(chart_data: list, goldbach_result: dict, chart_s
             "sentiment": goldbach_result.get("sentiment", "NEUTRAL"),
             "narrative": goldbach_result.get("narrative", "Goldbach analysis complete."),
             "reasoning": f"AI analysis unavailable ({str(e)}). Using pure mathematical analysis.",
-            "confidence": 50
+            "confidence": 50,
+            "error": str(e)[:200]
         }
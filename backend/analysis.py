@@ -0,0 +1,63 @@
+from goldbach import run_goldbach_analysis
+from features import chart_digest
+from ai_engine import analyze_chart, analyze_chart_with_goldbach
+
+DEFAULT_PERSONA = "You are a technical analyst. Analyze the chart for trends, support/resistance levels, and potential trade setups. Be concise and actionable."
+
+def run_analysis(chart_data: list, strategy_persona: str = None, chart_screenshot: str = None, series=None) -> dict:
+    """
+    The /analyze logic, shared by the API and the offline evaluation harness.
+    series is the data-store series chart_data was drawn from, if known, so
+    the precomputed features can be used for the prompt digest.
+    "error" is set when the AI call failed and the result is a fallback.
+    """
+    digest = chart_digest(chart_data, series)
+
+    # Mode A: Goldbach (Only when explicitly set)
+    if strategy_persona == "GOLDBACH_MODE":
+        # Run mathematical Goldbach analysis first
+        goldbach_result = run_goldbach_analysis(chart_data, digest)
+
+        # If we have a screenshot, enhance with AI vision analysis
+        if chart_screenshot:
+            ai_enhanced = analyze_chart_with_goldbach(
+                chart_data,
+                goldbach_result,
+                chart_screenshot,
+                digest
+            )
+            return {
+                "sentiment": ai_enhanced.get("sentiment", goldbach_result.get("sentiment", "NEUTRAL")),
+                "narrative": ai_enhanced.get("narrative", goldbach_result.get("narrative", "")),
+                "key_level": None,
+                "goldbach_levels": goldbach_result.get("levels_to_draw", []),
+                "dealing_range": goldbach_result.get("dealing_range"),
+                "current_status": goldbach_result.get("current_status"),
+                "signals": goldbach_result.get("signals"),
+                "error": ai_enhanced.get("error")
+            }
+
+        # No screenshot - return pure mathematical analysis
+        return {
+            "sentiment": goldbach_result.get("sentiment", "NEUTRAL"),
+            "narrative": goldbach_result.get("narrative", "Goldbach Analysis Complete"),
+            "key_level": None,
+            "goldbach_levels": goldbach_result.get("levels_to_draw", []),
+            "dealing_range": goldbach_result.get("dealing_range"),
+            "current_status": goldbach_result.get("current_status"),
+            "signals": goldbach_result.get("signals")
+        }
+
+    # Mode B: AI Analysis with optional screenshot
+    # Use a generic persona if none provided
+    persona = strategy_persona or DEFAULT_PERSONA
+    ai_result = analyze_chart(chart_data, persona, chart_screenshot, digest)
+    return {
+        "sentiment": ai_result.get("sentiment", "NEUTRAL"),
+        "narrative": ai_result.get("narrative", "Analysis complete."),
+        "key_level": ai_result.get("key_level"),
+        "goldbach_levels": [],
+        "reasoning": ai_result.get("reasoning"),
+        "confidence": ai_result.get("confidence"),
+        "error": ai_result.get("error")
+    }
@@ -0,0 +1,13 @@
+import os
+import secrets
+
+from fastapi import Header, HTTPException
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """
+    Dependency for admin-only endpoints. Without EDGE_ADMIN_TOKEN set they are closed to everyone.
+    """
+    token = os.environ.get("EDGE_ADMIN_TOKEN", "")
+    if not token or not secrets.compare_digest(x_admin_token or "", token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -0,0 +1,370 @@
+import os
+import json
+import fcntl
+import random
+import hashlib
+import calendar
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Source CSVs live next to the default es-4h.csv, named "<symbol>-<timeframe>.csv"
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+CACHE_DIR = os.environ.get("EDGE_CACHE_DIR", os.path.join(DATA_DIR, ".cache"))
+
+# Bytes at the start of the source CSV hashed to detect a rewrite (vs an append)
+HEAD_BYTES = 4096
+
+DEFAULT_SYMBOL = "es"
+DEFAULT_TIMEFRAME = "4h"
+
+# One fixed-size record per bar. Kept flat so the file can be mapped directly.
+BAR_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+
+def parse_csv_lines(lines) -> np.ndarray:
+    """
+    Parses raw "Date;Time;Open;High;Low;Close;Volume" lines (the load_csv format)
+    into bars. Malformed lines are skipped so a half-written tail is harmless.
+    """
+    bars = []
+    for line in lines:
+        parts = line.strip().split(";")
+        if len(parts) != 7:
+            continue
+        try:
+            ts = calendar.timegm(time.strptime(f"{parts[0]} {parts[1]}", "%d/%m/%Y %H:%M:%S"))
+            bars.append((ts, float(parts[2]), float(parts[3]), float(parts[4]), float(parts[5]), float(parts[6])))
+        except ValueError:
+            continue
+    return np.array(bars, dtype=BAR_DTYPE)
+
+
+def series_key(symbol: str, timeframe: str) -> str:
+    return f"{symbol.lower()}-{timeframe.lower()}"
+
+
+def source_path(symbol: str, timeframe: str) -> str:
+    return os.path.join(DATA_DIR, f"{series_key(symbol, timeframe)}.csv")
+
+
+class MarketSeries:
+    """
+    Read-only view of one instrument/timeframe backed by a memory-mapped file.
+    Every worker maps the same file, so the OS page cache holds a single copy.
+    """
+
+    def __init__(self, key: str, bin_path: str):
+        self.key = key
+        self.bin_path = bin_path
+        self._inode = None
+        self._bars = np.empty(0, dtype=BAR_DTYPE)
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Re-maps the file if it was rebuilt or grew since the last call.
+        Returns True if the visible data changed.
+        """
+        st = os.stat(self.bin_path)
+        length = st.st_size // BAR_DTYPE.itemsize
+        if st.st_ino == self._inode and length == len(self._bars):
+            return False
+
+        if length == 0:
+            self._bars = np.empty(0, dtype=BAR_DTYPE)
+        else:
+            self._bars = np.memmap(self.bin_path, dtype=BAR_DTYPE, mode="r", shape=(length,))
+        self._inode = st.st_ino
+        return True
+
+    @property
+    def bars(self) -> np.ndarray:
+        return self._bars
+
+    @property
+    def version(self) -> tuple:
+        """Changes whenever the underlying data changes; use it as a cache key."""
+        return (self._inode, len(self._bars))
+
+    def __len__(self):
+        return len(self._bars)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._bars[name]
+
+    def records(self, start: int, stop: int) -> list:
+        """
+        Converts bars [start, stop) into the dict shape the frontend expects.
+        """
+        records = []
+        for bar in self._bars[start:stop]:
+            ts = int(bar["time"])
+            dt = datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)
+            records.append({
+                "date": dt.strftime("%d/%m/%Y"),
+                "time": ts,
+                "open": float(bar["open"]),
+                "high": float(bar["high"]),
+                "low": float(bar["low"]),
+                "close": float(bar["close"]),
+                "volume": int(bar["volume"]),
+                "datetime": dt.isoformat(),
+            })
+        return records
+
+    def locate(self, first_time: int, last_time: int, count: int):
+        """
+        Returns (start, stop) if bars [start, stop) are exactly the count bars from
+        first_time to last_time, else None. Lets callers map chart data back to indices.
+        """
+        times = self.column("time")
+        start = int(np.searchsorted(times, first_time))
+        stop = start + count
+        if stop > len(times) or times[start] != first_time or times[stop - 1] != last_time:
+            return None
+        return start, stop
+
+    def bar_interval(self, lookback: int = 100) -> int:
+        """
+        Typical seconds between bars (median over the last lookback bars), 0 if unknown.
+        """
+        times = self.column("time")[-lookback:]
+        if len(times) < 2:
+            return 0
+        return int(np.median(np.diff(times)))
+
+    def random_slice(self, past: int = 100, future: int = 20):
+        """
+        Same contract as utils.get_random_slice, read straight from the mapped bars.
+        """
+        total_needed = past + future
+        if len(self) < total_needed:
+            raise ValueError("Series is too small for the requested slice.")
+
+        start_index = random.randint(0, len(self) - total_needed)
+        return (
+            self.records(start_index, start_index + past),
+            self.records(start_index + past, start_index + total_needed),
+        )
+
+    def latest_slice(self, n: int = 1000):
+        """
+        Same contract as utils.get_latest_slice: last n bars as past, no future.
+        """
+        return self.records(max(0, len(self) - n), len(self)), []
+
+
+class MarketDataStore:
+    """
+    Materializes each source CSV once into CACHE_DIR and hands out mapped views.
+    The first worker to need a series builds it under a file lock; the others
+    wait on the lock and then attach to the finished file.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._series = {}
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".bin", base + ".json", base + ".lock"
+
+    def _read_meta(self, meta_path: str) -> dict:
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _source_head(self, csv_path: str, length: int) -> str:
+        with open(csv_path, "rb") as f:
+            return hashlib.sha256(f.read(length)).hexdigest()
+
+    def _write_meta(self, meta_path: str, meta: dict):
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _build(self, csv_path: str, bin_path: str, meta_path: str):
+        # Imported here so workers that only attach never pay for pandas
+        from utils import load_csv
+
+        df = load_csv(csv_path)
+        bars = np.empty(len(df), dtype=BAR_DTYPE)
+        for name in BAR_DTYPE.names:
+            bars[name] = df[name].to_numpy()
+
+        st = os.stat(csv_path)
+        head_len = min(st.st_size, HEAD_BYTES)
+        tmp_path = bin_path + ".tmp"
+        bars.tofile(tmp_path)
+        # Atomic swap: workers holding the old mapping keep a valid inode
+        os.replace(tmp_path, bin_path)
+        self._write_meta(meta_path, {
+            "source": csv_path,
+            "source_size": st.st_size,
+            "source_mtime": st.st_mtime,
+            "source_head": self._source_head(csv_path, head_len),
+            "source_head_len": head_len,
+        })
+        print(f"Data store built {os.path.basename(bin_path)}: {len(bars)} candles.")
+
+    def get(self, symbol: str = DEFAULT_SYMBOL, timeframe: str = DEFAULT_TIMEFRAME) -> MarketSeries:
+        """
+        Returns the mapped series. The first call in a process builds the cache
+        file or catches it up with the source CSV; later calls only re-map.
+        """
+        key = series_key(symbol, timeframe)
+        series = self._series.get(key)
+        if series is not None:
+            series.refresh()
+            return series
+
+        csv_path = source_path(symbol, timeframe)
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Data file not found at {csv_path}")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        bin_path, meta_path, lock_path = self._paths(key)
+        with open(lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._sync_locked(key, csv_path, bin_path, meta_path)
+
+        series = MarketSeries(key, bin_path)
+        self._series[key] = series
+        return series
+
+    def _append_locked(self, series: MarketSeries, new_bars: np.ndarray) -> dict:
+        """
+        Appends bars to the series file. Caller must hold the series lock.
+        Mirrors load_csv: duplicates on time keep the first bar seen. Bars older
+        than the current last bar cannot be appended in place and are rejected.
+        """
+        series.refresh()
+        received = len(new_bars)
+        if received == 0:
+            return {"appended": 0, "duplicates": 0, "rejected": 0, "total": len(series)}
+
+        # Stable sort + unique keeps the first occurrence of each time in the batch
+        new_bars = new_bars[np.argsort(new_bars["time"], kind="stable")]
+        _, first_idx = np.unique(new_bars["time"], return_index=True)
+        new_bars = new_bars[first_idx]
+        duplicates = received - len(new_bars)
+
+        if len(series):
+            existing = series.column("time")
+            pos = np.searchsorted(existing, new_bars["time"])
+            known = (pos < len(existing)) & (existing[np.minimum(pos, len(existing) - 1)] == new_bars["time"])
+            duplicates += int(known.sum())
+            new_bars = new_bars[~known]
+            stale = new_bars["time"] < existing[-1]
+            rejected = int(stale.sum())
+            new_bars = new_bars[~stale]
+        else:
+            rejected = 0
+
+        if len(new_bars):
+            # Plain file append: O(k) per batch, readers pick it up on refresh()
+            with open(series.bin_path, "ab") as f:
+                f.write(new_bars.tobytes())
+            series.refresh()
+
+        return {"appended": len(new_bars), "duplicates": duplicates, "rejected": rejected, "total": len(series)}
+
+    def append(self, symbol: str, timeframe: str, new_bars: np.ndarray) -> dict:
+        """
+        Appends bars (BAR_DTYPE) to a series, visible to every worker on its next read.
+        """
+        series = self.get(symbol, timeframe)
+        _, _, lock_path = self._paths(series.key)
+        with open(lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return self._append_locked(series, new_bars)
+
+    def _sync_locked(self, key: str, csv_path: str, bin_path: str, meta_path: str) -> int:
+        """
+        Brings the cache file in line with the source CSV. Caller must hold the series lock.
+        An unchanged source is left alone; a source that only grew past the consumed
+        offset (same leading bytes, offset still at a line end) has its new lines
+        appended; anything else is rebuilt from scratch. Returns the bars appended.
+        """
+        meta = self._read_meta(meta_path)
+        if not os.path.exists(bin_path) or "source_head_len" not in meta:
+            self._build(csv_path, bin_path, meta_path)
+            return 0
+
+        offset = meta["source_size"]
+        st = os.stat(csv_path)
+        if st.st_size == offset and st.st_mtime == meta["source_mtime"]:
+            return 0
+
+        # Hash the same prefix as the build did; offset keeps growing with every tail
+        appended_to = (
+            st.st_size > offset
+            and self._source_head(csv_path, meta["source_head_len"]) == meta["source_head"]
+        )
+        if appended_to and offset > 0:
+            with open(csv_path, "rb") as f:
+                f.seek(offset - 1)
+                appended_to = f.read(1) == b"\n"
+        if not appended_to:
+            # Truncated, rewritten or touched in place: start over from scratch
+            self._build(csv_path, bin_path, meta_path)
+            return 0
+
+        with open(csv_path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read(st.st_size - offset)
+        # Only consume complete lines; a partial last line is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return 0
+
+        lines = chunk[:end].decode("utf-8", errors="ignore").splitlines()
+        result = self._append_locked(MarketSeries(key, bin_path), parse_csv_lines(lines))
+        if result["rejected"]:
+            # Usually bars POSTed to /candles got ahead of the CSV
+            print(f"Data store tail {key}: skipped {result['rejected']} lines older than the latest bar.")
+
+        meta.update({"source_size": offset + end, "source_mtime": st.st_mtime})
+        self._write_meta(meta_path, meta)
+        return result["appended"]
+
+    def tail_source(self, symbol: str = DEFAULT_SYMBOL, timeframe: str = DEFAULT_TIMEFRAME) -> int:
+        """
+        Ingests lines appended to the source CSV since the last build or tail.
+        The read offset lives in the shared meta file, so workers tailing the
+        same file never ingest a line twice. Returns the number of bars appended.
+        """
+        series = self.get(symbol, timeframe)
+        bin_path, meta_path, lock_path = self._paths(series.key)
+
+        with open(lock_path, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            appended = self._sync_locked(series.key, source_path(symbol, timeframe), bin_path, meta_path)
+        series.refresh()
+        return appended
+
+    def available(self) -> list:
+        """Lists (symbol, timeframe) pairs that have a source CSV in DATA_DIR."""
+        pairs = []
+        if not os.path.isdir(DATA_DIR):
+            return pairs
+        for name in sorted(os.listdir(DATA_DIR)):
+            stem, ext = os.path.splitext(name)
+            if ext == ".csv" and "-" in stem:
+                symbol, timeframe = stem.rsplit("-", 1)
+                pairs.append((symbol, timeframe))
+        return pairs
+
+
+store = MarketDataStore()
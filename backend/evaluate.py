@@ -0,0 +1,386 @@
+"""
+Offline evaluation of strategy personas against the revealed future bars.
+
+Draws N windows from the data store (same 200/50 split as /spin), runs the
+/analyze logic for each persona on the visible bars and scores the sentiment
+and key_level against what happened next. Every finished window is appended
+to a JSONL checkpoint, so an interrupted run picks up where it stopped.
+
+Examples:
+    python evaluate.py --windows 100 --persona GOLDBACH_MODE --backend stub
+    python evaluate.py --windows 100 --persona strategies/wyckoff.json --recordings eval/wyckoff-calls.jsonl
+    python evaluate.py --windows 100 --persona strategies/wyckoff.json --backend replay --recordings eval/wyckoff-calls.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import ai_engine
+from analysis import run_analysis
+from data_store import store, DEFAULT_SYMBOL, DEFAULT_TIMEFRAME
+from features import get_features
+
+PAST_BARS = 200
+FUTURE_BARS = 50
+
+# Moves smaller than this many ATRs over the future window count as NEUTRAL
+NEUTRAL_ATR = 1.0
+
+SENTIMENTS = ("BULLISH", "BEARISH", "NEUTRAL")
+
+
+# --- AI backends ---
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _prompt_key(contents) -> str:
+    # The harness never sends screenshots, so the prompt text identifies the call
+    text = contents[0] if isinstance(contents, list) else contents
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StubModel:
+    """
+    Deterministic coin-flip baseline: the sentiment is picked from a hash of the prompt.
+    """
+
+    def generate_content(self, contents, generation_config=None):
+        key = _prompt_key(contents)
+        return _Response(json.dumps({
+            "sentiment": SENTIMENTS[int(key, 16) % len(SENTIMENTS)],
+            "narrative": "Stub analysis.",
+            "key_level": None,
+            "reasoning": "Offline stub backend.",
+            "confidence": 50
+        }))
+
+
+class RecordedModel:
+    """
+    Replays responses recorded in a JSONL file, keyed by prompt hash.
+    With an inner model, misses are forwarded to it and recorded; without one
+    they raise, which the analysis functions report as a failed call.
+    """
+
+    def __init__(self, path: str, inner=None):
+        self.path = path
+        self.inner = inner
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._responses = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._responses[entry["key"]] = entry["text"]
+
+    def generate_content(self, contents, generation_config=None):
+        key = _prompt_key(contents)
+        if key in self._responses:
+            return _Response(self._responses[key])
+
+        with self._lock:
+            self.misses += 1
+        if self.inner is None:
+            raise KeyError(f"No recorded response for prompt {key[:12]}")
+
+        response = self.inner().generate_content(contents, generation_config=generation_config)
+        with self._lock:
+            self._responses[key] = response.text
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "text": response.text}) + "\n")
+        return _Response(response.text)
+
+
+# --- Personas, windows and scoring ---
+
+def persona_hash(persona) -> str:
+    """Short hash of the persona text, so edited personas aren't mixed with old results."""
+    return hashlib.sha256((persona or "").encode("utf-8")).hexdigest()[:12]
+
+
+def load_persona(spec: str):
+    """
+    Returns (name, persona) for GOLDBACH_MODE, "default" (the generic analyst)
+    or a file holding a compiled persona: /compile_strategy JSON or plain text.
+    """
+    if spec == "GOLDBACH_MODE":
+        return "goldbach", "GOLDBACH_MODE"
+    if spec == "default":
+        return "default", None
+
+    with open(spec, "r") as f:
+        text = f.read()
+    name = os.path.splitext(os.path.basename(spec))[0]
+    if spec.endswith(".json"):
+        data = json.loads(text)
+        return data.get("label", name), data["persona"]
+    return name, text.strip()
+
+
+def draw_windows(bars: int, count: int, seed: int) -> list:
+    """Start indices of count non-repeating windows, reproducible for a given seed."""
+    total = PAST_BARS + FUTURE_BARS
+    if bars < total:
+        raise ValueError("Series is too small for the requested windows.")
+    starts = random.Random(seed).sample(range(bars - total + 1), min(count, bars - total + 1))
+    return sorted(starts)
+
+
+def score(result: dict, past: list, future: list, atr: float) -> dict:
+    """
+    Compares an analysis result with the bars that followed it.
+    """
+    entry = past[-1]["close"]
+    move = future[-1]["close"] - entry
+    if abs(move) < NEUTRAL_ATR * atr:
+        actual = "NEUTRAL"
+    else:
+        actual = "BULLISH" if move > 0 else "BEARISH"
+
+    predicted = str(result.get("sentiment", "NEUTRAL")).upper()
+    direction = {"BULLISH": 1, "BEARISH": -1}.get(predicted, 0)
+
+    try:
+        key_level = float(result.get("key_level"))
+    except (TypeError, ValueError):
+        key_level = None
+    future_high = max(c["high"] for c in future)
+    future_low = min(c["low"] for c in future)
+
+    return {
+        "predicted": predicted,
+        "actual": actual,
+        "correct": predicted == actual,
+        "move": round(move, 2),
+        "pnl": round(direction * move, 2),
+        "key_level": key_level,
+        "key_level_hit": None if key_level is None else future_low <= key_level <= future_high,
+        "confidence": result.get("confidence"),
+    }
+
+
+def _empty_summary() -> dict:
+    return {
+        "windows": 0, "correct": 0, "pnl": 0.0, "key_levels": 0, "key_level_hits": 0, "latency": 0.0,
+        "failed": 0, "predicted": {k: 0 for k in SENTIMENTS},
+    }
+
+
+def summarize(records: list, failed: dict = None) -> dict:
+    """
+    Per-persona totals over scored windows. failed counts windows per persona
+    whose AI call failed; they are reported but not scored.
+    """
+    summary = {}
+    for name, count in (failed or {}).items():
+        summary.setdefault(name, _empty_summary())["failed"] = count
+    for r in records:
+        s = summary.setdefault(r["persona"], _empty_summary())
+        s["windows"] += 1
+        s["correct"] += r["correct"]
+        s["pnl"] += r["pnl"]
+        s["latency"] += r["latency"]
+        s["predicted"][r["predicted"]] = s["predicted"].get(r["predicted"], 0) + 1
+        if r["key_level"] is not None:
+            s["key_levels"] += 1
+            s["key_level_hits"] += r["key_level_hit"]
+
+    for s in summary.values():
+        n = s["windows"] or 1
+        s["accuracy"] = round(s["correct"] / n, 3)
+        s["avg_pnl"] = round(s["pnl"] / n, 2)
+        s["pnl"] = round(s["pnl"], 2)
+        s["avg_latency"] = round(s.pop("latency") / n, 3)
+        s["key_level_hit_rate"] = round(s["key_level_hits"] / s["key_levels"], 3) if s["key_levels"] else None
+    return summary
+
+
+# --- Checkpointing ---
+
+def open_checkpoint(path: str, config: dict, fresh: bool):
+    """
+    Returns (config, done, file). done maps result keys to finished records.
+    A resumed run reuses the stored config so it draws the same windows even
+    if the series has grown since.
+    """
+    done = {}
+    if fresh or not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        f = open(path, "w")
+        f.write(json.dumps({"type": "config", **config}) + "\n")
+        f.flush()
+        return config, done, f
+
+    stored = None
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Partial line from an interrupted write
+            if entry.get("type") == "config":
+                stored = entry
+            elif entry.get("type") == "result":
+                done[entry["key"]] = entry
+
+    if stored is None:
+        raise SystemExit(f"{path} has no config header; use --fresh to overwrite it.")
+    for field in ("symbol", "timeframe", "windows", "seed", "backend"):
+        if stored.get(field) != config[field]:
+            raise SystemExit(
+                f"{path} was written with {field}={stored.get(field)!r}, not {config[field]!r}; "
+                "use --fresh or another --checkpoint."
+            )
+
+    stored.pop("type")
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        cut_off = f.read(1) != b"\n"
+    f = open(path, "a")
+    if cut_off:
+        # Terminate a line cut off by an interruption so the next record starts clean
+        f.write("\n")
+    return stored, done, f
+
+
+async def evaluate(args):
+    personas = [load_persona(spec) for spec in args.persona]
+    series = store.get(args.symbol, args.timeframe)
+
+    config = {
+        "symbol": args.symbol,
+        "timeframe": args.timeframe,
+        "windows": args.windows,
+        "seed": args.seed,
+        # Replayed responses are Gemini's, so only the offline stub counts as a different backend
+        "backend": "stub" if args.backend == "stub" else "gemini",
+        "bars": len(series),
+    }
+    config, done, out = open_checkpoint(args.checkpoint, config, args.fresh)
+    starts = draw_windows(config["bars"], config["windows"], config["seed"])
+    atr = get_features(series)["atr"]
+
+    # Results are keyed by persona text hash too, so an edited persona is re-evaluated
+    personas = [(name, persona, persona_hash(persona)) for name, persona in personas]
+    pending = [
+        (name, persona, digest, start)
+        for name, persona, digest in personas
+        for start in starts
+        if f"{name}:{digest}:{start}" not in done
+    ]
+    total = len(personas) * len(starts)
+    print(f"Evaluating {len(personas)} persona(s) on {len(starts)} windows: "
+          f"{total - len(pending)} done, {len(pending)} to go.")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failed = {}
+    progress = {"finished": total - len(pending)}
+
+    async def run_one(name, persona, digest, start):
+        async with semaphore:
+            past = series.records(start, start + PAST_BARS)
+            future = series.records(start + PAST_BARS, start + PAST_BARS + FUTURE_BARS)
+            started = time.time()
+            result = await asyncio.to_thread(run_analysis, past, persona, None, series)
+            latency = time.time() - started
+
+        if result.get("error"):
+            # Not checkpointed, so a resumed run retries it
+            failed[name] = failed.get(name, 0) + 1
+            print(f"[failed] {name} @ {start}: {result['error']}")
+            return
+
+        record = {
+            "type": "result",
+            "key": f"{name}:{digest}:{start}",
+            "persona": name,
+            "persona_hash": digest,
+            "start": start,
+            "time": past[-1]["time"],
+            **score(result, past, future, float(atr[start + PAST_BARS - 1])),
+            "latency": round(latency, 3),
+        }
+        # Written from the event loop thread, one complete line per window
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+        done[record["key"]] = record
+        progress["finished"] += 1
+        print(f"[{progress['finished']}/{total}] {name} @ {start}: {record['predicted']} vs {record['actual']}")
+
+    try:
+        await asyncio.gather(*(run_one(*job) for job in pending))
+    finally:
+        out.close()
+
+    current = {(name, digest) for name, _, digest in personas}
+    records = [r for r in done.values() if (r["persona"], r.get("persona_hash")) in current]
+    return summarize(records, failed)
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score strategy personas against future bars.")
+    parser.add_argument("--persona", action="append", required=True,
+                        help="GOLDBACH_MODE, default, or a persona file (.json from /compile_strategy or .txt). Repeatable.")
+    parser.add_argument("--windows", type=_positive_int, default=50, help="Number of windows to draw.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for drawing windows.")
+    parser.add_argument("--symbol", default=DEFAULT_SYMBOL)
+    parser.add_argument("--timeframe", default=DEFAULT_TIMEFRAME)
+    parser.add_argument("--concurrency", type=_positive_int, default=4, help="Max analyses in flight at once.")
+    parser.add_argument("--backend", choices=["gemini", "stub", "replay"], default="gemini",
+                        help="AI backend: live Gemini, offline stub, or replay of --recordings.")
+    parser.add_argument("--recordings", help="JSONL of AI responses: written by gemini, read by replay.")
+    parser.add_argument("--checkpoint", default="eval_checkpoint.jsonl", help="Results file used to resume.")
+    parser.add_argument("--fresh", action="store_true", help="Discard an existing checkpoint.")
+    parser.add_argument("--summary", help="Also write the summary JSON here.")
+    args = parser.parse_args()
+
+    recorder = None
+    if args.backend == "stub":
+        ai_engine.set_model_factory(StubModel)
+    elif args.backend == "replay":
+        if not args.recordings:
+            parser.error("--backend replay needs --recordings")
+        recorder = RecordedModel(args.recordings)
+        ai_engine.set_model_factory(lambda: recorder)
+    elif args.recordings:
+        recorder = RecordedModel(args.recordings, inner=ai_engine.gemini_model)
+        ai_engine.set_model_factory(lambda: recorder)
+
+    summary = asyncio.run(evaluate(args))
+
+    print(f"\n{'persona':<16}{'windows':>8}{'failed':>8}{'accuracy':>10}{'avg pnl':>10}{'total pnl':>11}{'key hit':>9}{'latency':>9}")
+    for name, s in sorted(summary.items()):
+        hit = f"{s['key_level_hit_rate']:.3f}" if s["key_level_hit_rate"] is not None else "-"
+        print(f"{name:<16}{s['windows']:>8}{s['failed']:>8}{s['accuracy']:>10.3f}{s['avg_pnl']:>10.2f}{s['pnl']:>11.2f}{hit:>9}{s['avg_latency']:>9.3f}")
+    failed = sum(s["failed"] for s in summary.values())
+    if failed:
+        print(f"\n{failed} window(s) failed and were not checkpointed; re-run the same command to retry them.")
+    if recorder is not None and recorder.misses:
+        print(f"{recorder.misses} AI call(s) had no recorded response.")
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from goldbach import DEALING_RANGE_PO3S, nearest_po3, calculate_dealing_range
+
+RANGE_WINDOW = 20  # Bars in the rolling high-low range
+ATR_PERIOD = 14
+SWING_SPAN = 2  # Bars on each side that a swing high/low must exceed
+
+_PO3 = np.array(DEALING_RANGE_PO3S, dtype=np.float64)
+
+
+def _rolling(values: np.ndarray, window: int, fn) -> np.ndarray:
+    """
+    Rolling fn over the trailing window; the first bars use whatever history exists.
+    """
+    out = np.empty(len(values), dtype=np.float64)
+    head = min(window - 1, len(values))
+    for i in range(head):
+        out[i] = fn(values[:i + 1])
+    if len(values) >= window:
+        out[window - 1:] = fn(sliding_window_view(values, window), axis=1)
+    return out
+
+
+def _forward_fill(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Carries values[i] forward from every i where mask is set; NaN before the first one.
+    """
+    idx = np.where(mask, np.arange(len(values)), -1)
+    idx = np.maximum.accumulate(idx)
+    out = np.where(idx >= 0, values[np.maximum(idx, 0)], np.nan)
+    return out
+
+
+def _swings(values: np.ndarray, highs: bool) -> np.ndarray:
+    """
+    Marks pivot bars: strictly beyond the SWING_SPAN bars before, at least equal to those after.
+    """
+    n = len(values)
+    pivots = np.zeros(n, dtype=bool)
+    if n < 2 * SWING_SPAN + 1:
+        return pivots
+
+    center = values[SWING_SPAN:n - SWING_SPAN]
+    is_pivot = np.ones(len(center), dtype=bool)
+    for k in range(1, SWING_SPAN + 1):
+        before = values[SWING_SPAN - k:n - SWING_SPAN - k]
+        after = values[SWING_SPAN + k:n - SWING_SPAN + k]
+        if highs:
+            is_pivot &= (center > before) & (center >= after)
+        else:
+            is_pivot &= (center < before) & (center <= after)
+    pivots[SWING_SPAN:n - SWING_SPAN] = is_pivot
+    return pivots
+
+
+def compute_features(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> dict:
+    """
+    Computes per-bar features as arrays aligned with the input bars.
+    Everything except swing_high/swing_low is causal (uses bars <= i only).
+    Swing flags sit on the pivot bar and are only confirmed SWING_SPAN bars later;
+    last_swing_high/last_swing_low give the latest swing already confirmed at bar i.
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+
+    range_high = _rolling(high, RANGE_WINDOW, np.max)
+    range_low = _rolling(low, RANGE_WINDOW, np.min)
+    rolling_range = range_high - range_low
+
+    # Wilder's ATR over the true range
+    prev_close = np.concatenate(([close[0]], close[:-1])) if n else close
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    atr = np.empty(n, dtype=np.float64)
+    seed = min(ATR_PERIOD, n)
+    if seed:
+        atr[:seed] = np.cumsum(true_range[:seed]) / np.arange(1, seed + 1)
+    for i in range(seed, n):
+        atr[i] = (atr[i - 1] * (ATR_PERIOD - 1) + true_range[i]) / ATR_PERIOD
+
+    swing_high = _swings(high, highs=True)
+    swing_low = _swings(low, highs=False)
+    # Shift pivots to the bar where they become known before carrying them forward
+    confirmed_high = np.zeros(n, dtype=bool)
+    confirmed_low = np.zeros(n, dtype=bool)
+    confirmed_high[SWING_SPAN:] = swing_high[:n - SWING_SPAN]
+    confirmed_low[SWING_SPAN:] = swing_low[:n - SWING_SPAN]
+    shifted_high = np.concatenate((np.full(SWING_SPAN, np.nan), high[:n - SWING_SPAN]))[:n]
+    shifted_low = np.concatenate((np.full(SWING_SPAN, np.nan), low[:n - SWING_SPAN]))[:n]
+
+    # Dealing range from the PO3 nearest the rolling range. This is a per-bar
+    # feature; window_digest sizes the window's own dealing range like get_dynamic_po3
+    rolling_po3_size = _PO3[np.argmin(np.abs(_PO3[None, :] - rolling_range[:, None]), axis=1)] if n else _PO3[:0]
+    rolling_dr_low = np.floor(close / rolling_po3_size) * rolling_po3_size if n else close
+    rolling_dr_position = (close - rolling_dr_low) / rolling_po3_size if n else close
+
+    # Three-candle fair value gaps, flagged on the third candle
+    bullish_gap = np.zeros(n, dtype=bool)
+    bearish_gap = np.zeros(n, dtype=bool)
+    if n > 2:
+        bullish_gap[2:] = low[2:] > high[:-2]
+        bearish_gap[2:] = high[2:] < low[:-2]
+
+    return {
+        "rolling_range": rolling_range,
+        "range_high": range_high,
+        "range_low": range_low,
+        "atr": atr,
+        "swing_high": swing_high,
+        "swing_low": swing_low,
+        "last_swing_high": _forward_fill(shifted_high, confirmed_high),
+        "last_swing_low": _forward_fill(shifted_low, confirmed_low),
+        "rolling_po3_size": rolling_po3_size,
+        "rolling_dr_position": rolling_dr_position,
+        "bullish_gap": bullish_gap,
+        "bearish_gap": bearish_gap,
+    }
+
+
+# series key -> (series version, features)
+_cache = {}
+
+def get_features(series) -> dict:
+    """
+    Features for a whole data-store series, computed on first use and
+    recomputed only when its version changes. Each worker keeps its own copy,
+    so only series that are actually analyzed cost memory.
+    """
+    cached = _cache.get(series.key)
+    if cached is not None and cached[0] == series.version:
+        return cached[1]
+
+    features = compute_features(series.column("high"), series.column("low"), series.column("close"))
+    _cache[series.key] = (series.version, features)
+    return features
+
+
+def features_for_chart(chart_data: list, series=None):
+    """
+    Returns (features, prices, start, stop) for the bars in chart_data, where
+    prices holds the high/low/close arrays the features are aligned with.
+    When chart_data is a contiguous window of series (e.g. from /spin) and its
+    prices match the stored bars, the cached series features are used as-is;
+    otherwise they are computed from chart_data.
+    """
+    chart_prices = {
+        name: np.array([c[name] for c in chart_data], dtype=np.float64)
+        for name in ("high", "low", "close")
+    }
+
+    if series is not None and chart_data and "time" in chart_data[0]:
+        bounds = series.locate(chart_data[0]["time"], chart_data[-1]["time"], len(chart_data))
+        if bounds is not None:
+            start, stop = bounds
+            prices = {name: series.column(name) for name in ("high", "low", "close")}
+            # Matching times and count don't prove the client sent the same bars
+            if all(np.array_equal(prices[name][start:stop], chart_prices[name]) for name in prices):
+                return get_features(series), prices, start, stop
+
+    prices = chart_prices
+    features = compute_features(prices["high"], prices["low"], prices["close"])
+    return features, prices, 0, len(chart_data)
+
+
+def window_digest(features: dict, high, low, close, start: int, stop: int) -> dict:
+    """
+    Compact summary of bars [start, stop) for prompts and analysis.
+    high/low/close are indexed the same way as features.
+    """
+    last = stop - 1
+    window_high = float(np.max(high[start:stop]))
+    window_low = float(np.min(low[start:stop]))
+    last_close = float(close[last])
+    first_close = float(close[start])
+
+    # Same dealing range as get_dynamic_po3/run_goldbach_analysis for these bars
+    po3_size = nearest_po3(window_high - window_low)
+    dr_low, _ = calculate_dealing_range(last_close, po3_size)
+
+    # Only pivots already confirmed by the window's last bar
+    confirmed_stop = max(start, stop - SWING_SPAN)
+    swing_highs = np.flatnonzero(features["swing_high"][start:confirmed_stop])
+    swing_lows = np.flatnonzero(features["swing_low"][start:confirmed_stop])
+    bullish_gaps = np.flatnonzero(features["bullish_gap"][start:stop])
+    bearish_gaps = np.flatnonzero(features["bearish_gap"][start:stop])
+    bars = stop - start
+
+    def bars_ago(indices):
+        return int(bars - 1 - indices[-1]) if len(indices) else None
+
+    def price(value):
+        return None if np.isnan(value) else round(float(value), 2)
+
+    return {
+        "bars": bars,
+        "window_high": round(window_high, 2),
+        "window_low": round(window_low, 2),
+        "window_range": round(window_high - window_low, 2),
+        "close": round(last_close, 2),
+        "change_pct": round((last_close - first_close) / first_close * 100, 2) if first_close else 0.0,
+        "window_position": round((last_close - window_low) / (window_high - window_low), 2) if window_high > window_low else 0.5,
+        "rolling_range": round(float(features["rolling_range"][last]), 2),
+        "atr": round(float(features["atr"][last]), 2),
+        "atr_window_avg": round(float(np.mean(features["atr"][start:stop])), 2),
+        "po3_size": po3_size,
+        "dr_position": round((last_close - dr_low) / po3_size, 2),
+        "last_swing_high": price(features["last_swing_high"][last]),
+        "last_swing_high_bars_ago": bars_ago(swing_highs),
+        "last_swing_low": price(features["last_swing_low"][last]),
+        "last_swing_low_bars_ago": bars_ago(swing_lows),
+        "swing_highs": len(swing_highs),
+        "swing_lows": len(swing_lows),
+        "bullish_gaps": len(bullish_gaps),
+        "bearish_gaps": len(bearish_gaps),
+        "last_gap_bars_ago": min(
+            (x for x in (bars_ago(bullish_gaps), bars_ago(bearish_gaps)) if x is not None),
+            default=None
+        ),
+    }
+
+
+def chart_digest(chart_data: list, series=None) -> dict:
+    """
+    window_digest for chart_data, reading precomputed series features when possible.
+    """
+    if not chart_data:
+        return {}
+
+    features, prices, start, stop = features_for_chart(chart_data, series)
+    return window_digest(features, prices["high"], prices["low"], prices["close"], start, stop)
@@ -11,13 +11,16 @@ def get_dynamic_po3(price_data):
     max_high = max(p['high'] for p in price_data)
     visible_range = max_high - min_low
     
-    # PO3 candidates (Powers of 3)
-    po3s = [9, 27, 81, 243, 729, 2187, 6561]
-    
-    # Find nearest PO3 to the visible range
-    best_po3 = min(po3s, key=lambda x: abs(x - visible_range))
-    
-    return best_po3
+    return nearest_po3(visible_range)
+
+# PO3 candidates (Powers of 3) for a window's dealing range
+DEALING_RANGE_PO3S = [9, 27, 81, 243, 729, 2187, 6561]
+
+def nearest_po3(price_range):
+    """
+    The dealing range PO3 nearest to price_range (the first one on a tie).
+    """
+    return min(DEALING_RANGE_PO3S, key=lambda x: abs(x - price_range))
 
 def calculate_dealing_range(current_price, po3_number):
     """
@@ -28,51 +31,57 @@ def calculate_dealing_range(current_price, po3_number):
     range_high = range_low + po3_number
     return range_low, range_high
 
+PO3_SCALES = [3, 9, 27, 81, 243, 729, 2187, 6561]
+
+GOLDBACH_RATIOS = {
+    0.00: "Range Low (Hard Boundary)",
+    0.03: "Rejection Block (RB)",
+    0.11: "Order Block (OB)",
+    0.17: "Fair Value Gap (FVG)",
+    0.29: "Liquidity Void (LV)",
+    0.41: "Breaker (BR)",
+    0.50: "Equilibrium (EQ)",
+    0.59: "Breaker (BR)",
+    0.71: "Liquidity Void (LV)",
+    0.83: "Fair Value Gap (FVG)",
+    0.89: "Order Block (OB)",
+    0.97: "Rejection Block (RB)",
+    1.00: "Range High (Hard Boundary)"
+}
+
+def get_level_color(ratio, label):
+    """
+    Color coding based on the role of a Goldbach level.
+    """
+    color = "white"
+    if "Order Block" in label:
+        color = "#ef4444" if ratio < 0.5 else "#22c55e" # Red for support? Wait, OBs can be both. Let's stick to user prompt colors if any.
+        # Prompt example: OB (0.11) is red.
+        if ratio == 0.11: color = "red"
+        if ratio == 0.89: color = "green" # Assumption
+    elif "Equilibrium" in label:
+        color = "yellow"
+    elif "Range" in label:
+        color = "white"
+    else:
+        color = "gray"
+    return color
+
 def get_goldbach_levels(range_low, range_high):
     """
     Generates the list of price levels for all Goldbach ratios.
     """
-    ratios = {
-        0.00: "Range Low (Hard Boundary)",
-        0.03: "Rejection Block (RB)",
-        0.11: "Order Block (OB)",
-        0.17: "Fair Value Gap (FVG)",
-        0.29: "Liquidity Void (LV)",
-        0.41: "Breaker (BR)",
-        0.50: "Equilibrium (EQ)",
-        0.59: "Breaker (BR)",
-        0.71: "Liquidity Void (LV)",
-        0.83: "Fair Value Gap (FVG)",
-        0.89: "Order Block (OB)",
-        0.97: "Rejection Block (RB)",
-        1.00: "Range High (Hard Boundary)"
-    }
-    
     price_range = range_high - range_low
     levels = []
     
-    for ratio, label in ratios.items():
+    for ratio, label in GOLDBACH_RATIOS.items():
         price = range_low + (price_range * ratio)
-        
-        # Color coding based on role
-        color = "white"
-        if "Order Block" in label:
-            color = "#ef4444" if ratio < 0.5 else "#22c55e" # Red for support? Wait, OBs can be both. Let's stick to user prompt colors if any.
-            # Prompt example: OB (0.11) is red.
-            if ratio == 0.11: color = "red"
-            if ratio == 0.89: color = "green" # Assumption
-        elif "Equilibrium" in label:
-            color = "yellow"
-        elif "Range" in label:
-            color = "white"
-        else:
-            color = "gray"
 
         levels.append({
             "price": round(price, 2),
             "label": f"{label} ({ratio})",
             "ratio": ratio,
-            "color": color
+            "color": get_level_color(ratio, label)
         })
         
     return levels
@@ -183,7 +192,7 @@ def calculate_goldbach_for_range(visible_high: float, visible_low: float, curren
     visible_range = visible_high - visible_low
 
     # PO3 candidates (Powers of 3)
-    po3s = [3, 9, 27, 81, 243, 729, 2187, 6561]
+    po3s = PO3_SCALES
 
     # Find nearest PO3 to the visible range
     # Use a PO3 that's roughly 1/3 to 1/2 of the visible range for better coverage
@@ -246,9 +255,10 @@ def calculate_goldbach_for_range(visible_high: float, visible_low: float, curren
         }
     }
 
-def run_goldbach_analysis(price_data):
+def run_goldbach_analysis(price_data, digest=None):
     """
     Main execution function for Goldbach Strategy.
+    digest is an optional features.window_digest of price_data.
     """
     if not price_data:
         return {}
@@ -256,7 +266,8 @@ def run_goldbach_analysis(price_data):
     current_price = price_data[-1]['close']
     
     # Step 1: Define the Grid (Dynamic PO3)
-    po3_size = get_dynamic_po3(price_data)
+    # The digest already sized the window's range the same way (goldbach.nearest_po3)
+    po3_size = digest['po3_size'] if digest else get_dynamic_po3(price_data)
     range_low, range_high = calculate_dealing_range(current_price, po3_number=po3_size)
     levels = get_goldbach_levels(range_low, range_high)
     
@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+
+from goldbach import PO3_SCALES, GOLDBACH_RATIOS, get_level_color
+
+# Ratios used per zone. 1.00 is left out because it is the next zone's 0.00;
+# the closing boundary of the last zone is added once at the end.
+_ZONE_RATIOS = np.array([r for r in GOLDBACH_RATIOS if r < 1.0])
+_RATIO_LABELS = {ratio: label for ratio, label in GOLDBACH_RATIOS.items()}
+
+# Soft cap on levels returned when the caller doesn't pick a minimum scale
+MAX_AUTO_LEVELS = 500
+# Hard cap on levels_between, whatever the minimum scale
+MAX_LEVELS = 5000
+
+
+class LevelIndex:
+    """
+    Sorted Goldbach levels for every PO3 scale over a price range.
+    Each scale keeps its own sorted price array, so range and nearest-level
+    queries are a binary search per scale instead of a scan.
+    """
+
+    def __init__(self, low: float, high: float, scales=PO3_SCALES):
+        self.scales = list(scales)
+        # Pad by one zone of the largest scale so zooming past the data still hits the index
+        pad = max(self.scales)
+        self.low = math.floor((low - pad) / pad) * pad
+        self.high = math.ceil((high + pad) / pad) * pad
+
+        self._prices = {}
+        self._ratios = {}
+        for scale in self.scales:
+            zone_lows = np.arange(self.low, self.high, scale, dtype=np.float64)
+            prices = (zone_lows[:, None] + _ZONE_RATIOS[None, :] * scale).ravel()
+            ratios = np.tile(_ZONE_RATIOS, len(zone_lows))
+            self._prices[scale] = np.append(prices, float(self.high))
+            self._ratios[scale] = np.append(ratios, 0.0)
+
+    def covers(self, low: float, high: float) -> bool:
+        return self.low <= low and high <= self.high
+
+    def __len__(self):
+        return sum(len(p) for p in self._prices.values())
+
+    def _level(self, scale: int, i: int) -> dict:
+        price = float(self._prices[scale][i])
+        ratio = float(self._ratios[scale][i])
+        zone_low = price - ratio * scale
+        label = _RATIO_LABELS[ratio]
+        return {
+            "price": round(price, 2),
+            "label": f"PO3 {scale} {label} ({ratio})",
+            "ratio": ratio,
+            "scale": scale,
+            "zone_low": round(zone_low, 2),
+            "zone_high": round(zone_low + scale, 2),
+            "color": get_level_color(ratio, label),
+        }
+
+    def clamp(self, price: float) -> float:
+        """Pulls price into the index coverage."""
+        return min(max(price, self.low), self.high)
+
+    def _bounds(self, scale: int, low: float, high: float):
+        prices = self._prices[scale]
+        return int(np.searchsorted(prices, low, side="left")), int(np.searchsorted(prices, high, side="right"))
+
+    def count_between(self, low: float, high: float, min_scale: int = 3) -> int:
+        """Number of levels levels_between would return, without building them."""
+        total = 0
+        for scale in self.scales:
+            if scale >= min_scale:
+                start, stop = self._bounds(scale, low, high)
+                total += stop - start
+        return total
+
+    def auto_min_scale(self, low: float, high: float, max_levels: int = MAX_AUTO_LEVELS) -> int:
+        """
+        Smallest scale whose levels in [low, high] (all coarser scales included) fit in max_levels.
+        """
+        total = 0
+        for i in reversed(range(len(self.scales))):
+            start, stop = self._bounds(self.scales[i], low, high)
+            total += stop - start
+            if total > max_levels:
+                # The next coarser scale is the finest that fit (the coarsest if none did)
+                return self.scales[min(i + 1, len(self.scales) - 1)]
+        return self.scales[0]
+
+    def levels_between(self, low: float, high: float, min_scale: int = 3, max_levels: int = MAX_LEVELS) -> list:
+        """
+        All levels with low <= price <= high at scales >= min_scale, sorted by price
+        (coarser scale first when several scales share a price).
+        Raises ValueError if that is more than max_levels levels.
+        """
+        count = self.count_between(low, high, min_scale)
+        if count > max_levels:
+            raise ValueError(f"{count} levels in range at scale >= {min_scale}; the limit is {max_levels}")
+
+        found = []
+        for scale in self.scales:
+            if scale < min_scale:
+                continue
+            prices = self._prices[scale]
+            start, stop = self._bounds(scale, low, high)
+            found.extend((prices[i], -scale, i) for i in range(start, stop))
+
+        found.sort()
+        return [self._level(-neg_scale, i) for _, neg_scale, i in found]
+
+    def nearest(self, price: float, min_scale: int = 3) -> dict:
+        """
+        Nearest level to price at each scale >= min_scale, keyed by scale.
+        """
+        nearest = {}
+        for scale in self.scales:
+            if scale < min_scale:
+                continue
+            prices = self._prices[scale]
+            i = int(np.searchsorted(prices, price))
+            if i == len(prices) or (i > 0 and price - prices[i - 1] <= prices[i] - price):
+                i -= 1
+            nearest[scale] = self._level(scale, i)
+        return nearest
+
+
+_index = None
+
+def build_level_index(low: float, high: float) -> LevelIndex:
+    """
+    Builds (or widens) the shared index over a data set's price range. Only call
+    this with ranges taken from loaded data: the index is kept for the process
+    lifetime, so it must never grow with client input.
+    """
+    global _index
+    if _index is None or not _index.covers(low, high):
+        if _index is not None:
+            low, high = min(low, _index.low), max(high, _index.high)
+        _index = LevelIndex(low, high)
+    return _index
+
+def get_level_index():
+    """Returns the shared index, or None until data has been loaded."""
+    return _index
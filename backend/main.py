@@ -1,20 +1,121 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, model_validator
 from typing import List, Optional, Dict, Any
-import uvicorn
+from contextlib import asynccontextmanager
+import asyncio
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
-import google.generativeai as genai
 
-from utils import load_csv, get_random_slice, get_latest_slice
-from goldbach import run_goldbach_analysis, calculate_goldbach_for_range
-from ai_engine import compile_strategy, analyze_chart, analyze_chart_with_goldbach
+import numpy as np
+
+# Heavy dependencies (pandas, google.generativeai, uvicorn) are imported on first use
+from data_store import store, series_key, BAR_DTYPE, DEFAULT_SYMBOL, DEFAULT_TIMEFRAME
+from goldbach import calculate_goldbach_for_range, PO3_SCALES
+from level_index import build_level_index, get_level_index
+from ai_engine import compile_strategy
+from analysis import run_analysis
+from auth import require_admin
+
+# Seconds between polls of the source CSV for appended bars (0 disables tailing)
+TAIL_INTERVAL = float(os.environ.get("EDGE_TAIL_INTERVAL", "2"))
+# POST /candles rejects bars more than this many bar intervals past max(latest bar, now)
+MAX_CANDLE_LEAD = 5
+
+# Only reported by /readyz; ai_engine warns about a missing key when the model is first used
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+
+# --- Data Loading ---
+# Filled in by load_market_data() in the background and reported by /readyz
+data_status = {
+    "state": "pending",  # pending | loading | ready | failed
+    "series": {},
+    "error": None,
+    "started_at": None,
+    "finished_at": None,
+}
+
+def load_market_data():
+    """
+    Maps every available series into the data store (building cache files if needed).
+    Runs in a worker thread so the server can bind and answer probes meanwhile.
+    """
+    data_status["state"] = "loading"
+    data_status["started_at"] = time.time()
+    pairs = store.available()
+    for symbol, timeframe in pairs:
+        data_status["series"][series_key(symbol, timeframe)] = {"state": "pending"}
+
+    for symbol, timeframe in pairs:
+        entry = data_status["series"][series_key(symbol, timeframe)]
+        entry["state"] = "loading"
+        try:
+            loaded = store.get(symbol, timeframe)
+            if len(loaded):
+                # Warm the level index over the price range. Series features stay
+                # lazy (first /analyze of a spin window) so idle workers don't hold them
+                build_level_index(float(loaded.column("low").min()), float(loaded.column("high").max()))
+            entry["state"] = "ready"
+            print(f"Data loaded: {symbol}-{timeframe} {len(loaded)} candles.")
+        except Exception as e:
+            entry["state"] = "failed"
+            entry["error"] = str(e)
+            print(f"Error loading {symbol}-{timeframe}: {e}")
+
+    default = data_status["series"].get(series_key(DEFAULT_SYMBOL, DEFAULT_TIMEFRAME))
+    if default is None:
+        data_status["error"] = f"No data file for {DEFAULT_SYMBOL}-{DEFAULT_TIMEFRAME}"
+    elif default["state"] == "failed":
+        data_status["error"] = default["error"]
+    data_status["state"] = "failed" if data_status["error"] else "ready"
+    data_status["finished_at"] = time.time()
+
+def require_series(symbol: str, timeframe: str):
+    """Returns a loaded series or raises the HTTP error that explains why it can't."""
+    entry = data_status["series"].get(series_key(symbol, timeframe))
+    if data_status["state"] in ("pending", "loading") and (entry is None or entry["state"] != "ready"):
+        raise HTTPException(status_code=503, detail="Data still loading")
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No data for {symbol} {timeframe}")
+    if entry["state"] != "ready":
+        raise HTTPException(status_code=500, detail=f"Data not loaded: {entry.get('error')}")
+    return store.get(symbol, timeframe)
+
+def loaded_series(symbol: str, timeframe: str):
+    """Returns the series if it has finished loading, else None (never raises)."""
+    entry = data_status["series"].get(series_key(symbol, timeframe))
+    return store.get(symbol, timeframe) if entry and entry["state"] == "ready" else None
+
+async def tail_market_data():
+    """Polls the source CSVs of loaded series and appends any new bars."""
+    while True:
+        await asyncio.sleep(TAIL_INTERVAL)
+        for key, entry in list(data_status["series"].items()):
+            if entry["state"] != "ready":
+                continue
+            symbol, timeframe = key.rsplit("-", 1)
+            try:
+                appended = await asyncio.to_thread(store.tail_source, symbol, timeframe)
+                if appended:
+                    print(f"Appended {appended} candles to {key}.")
+            except Exception as e:
+                print(f"Error tailing {key}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_task = asyncio.create_task(asyncio.to_thread(load_market_data))
+    tail_task = asyncio.create_task(tail_market_data()) if TAIL_INTERVAL > 0 else None
+    yield
+    if tail_task:
+        tail_task.cancel()
+    load_task.cancel()
 
 # Initialize App
-app = FastAPI(title="Edge.ai Backend")
+app = FastAPI(title="Edge.ai Backend", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -23,28 +124,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
 
-# Load Data Once
-try:
-    df = load_csv()
-    print(f"Data loaded: {len(df)} candles.")
-except Exception as e:
-    print(f"Error loading data: {e}")
-    df = None
-
-# Configure Gemini
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("WARNING: GEMINI_API_KEY not found in environment variables.")
+# Opt-in request profiling; when off, nothing is imported or installed
+if os.environ.get("EDGE_PROFILING") == "1":
+    if os.environ.get("EDGE_ADMIN_TOKEN"):
+        from profiling import ProfilingMiddleware, router as profiling_router
+        app.add_middleware(ProfilingMiddleware)
+        app.include_router(profiling_router)
+        print("Request profiling enabled.")
+    else:
+        print("WARNING: EDGE_PROFILING requires EDGE_ADMIN_TOKEN; profiling disabled.")
 
 # --- Models ---
 class SpinResponse(BaseModel):
     past_data: List[dict]
     future_data: List[dict]
 
+class Candle(BaseModel):
+    time: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float = 0
+
+    @model_validator(mode="after")
+    def check_bar(self):
+        if self.time <= 0:
+            raise ValueError("time must be a positive unix timestamp")
+        if not self.low <= min(self.open, self.close) <= max(self.open, self.close) <= self.high:
+            raise ValueError("candle must satisfy low <= open, close <= high")
+        if self.volume < 0:
+            raise ValueError("volume must not be negative")
+        return self
+
+class AppendCandlesRequest(BaseModel):
+    candles: List[Candle]
+    symbol: str = DEFAULT_SYMBOL
+    timeframe: str = DEFAULT_TIMEFRAME
+
+class AppendCandlesResponse(BaseModel):
+    appended: int
+    duplicates: int
+    rejected: int
+    total: int
+
 class AnalyzeRequest(BaseModel):
     chart_data: List[dict]
     strategy_persona: Optional[str] = None
@@ -70,6 +196,17 @@ class GoldbachLevelsResponse(BaseModel):
     levels: List[dict]
     dealing_range: Dict[str, Any]
 
+class FractalLevelsRequest(BaseModel):
+    visible_high: float
+    visible_low: float
+    current_price: float
+    min_scale: Optional[int] = None  # Defaults to the finest scale that keeps the response small
+
+class FractalLevelsResponse(BaseModel):
+    levels: List[dict]
+    nearest: Dict[int, dict]
+    min_scale: int
+
 # --- Endpoints ---
 
 
@@ -77,6 +214,35 @@ class GoldbachLevelsResponse(BaseModel):
 async def root():
     return {"message": "Edge.ai Backend is running", "status": "ok"}
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving, regardless of data state."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the default series is mapped, 503 while loading or on failure."""
+    started = data_status["started_at"]
+    elapsed = (data_status["finished_at"] or time.time()) - started if started else 0
+    # Counted from the shared mapped file: bars appended by any worker show up here
+    series = {}
+    for key, entry in list(data_status["series"].items()):
+        series[key] = dict(entry)
+        if entry["state"] == "ready":
+            series[key]["candles"] = len(store.get(*key.rsplit("-", 1)))
+    body = {
+        "status": data_status["state"],
+        "series": series,
+        "error": data_status["error"],
+        "elapsed_seconds": round(elapsed, 3),
+        "ai_configured": bool(GEMINI_API_KEY),
+    }
+    return JSONResponse(status_code=200 if data_status["state"] == "ready" else 503, content=body)
+
+@app.get("/instruments")
+async def list_instruments():
+    return {"instruments": [{"symbol": s, "timeframe": t} for s, t in store.available()]}
+
 @app.post("/goldbach_levels", response_model=GoldbachLevelsResponse)
 async def get_goldbach_levels(request: GoldbachLevelsRequest):
     """Calculate Goldbach levels based on visible chart range (for dynamic zoom updates)"""
@@ -87,15 +253,64 @@ async def get_goldbach_levels(request: GoldbachLevelsRequest):
     )
     return result
 
+@app.post("/fractal_levels", response_model=FractalLevelsResponse)
+async def get_fractal_levels(request: FractalLevelsRequest):
+    """Nested Goldbach grids across all PO3 scales for the Infinite Zoom view"""
+    if request.visible_low > request.visible_high:
+        raise HTTPException(status_code=400, detail="visible_low must not exceed visible_high")
+
+    if request.min_scale is not None and request.min_scale not in PO3_SCALES:
+        raise HTTPException(status_code=400, detail=f"min_scale must be one of {PO3_SCALES}")
+
+    index = get_level_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Data still loading")
+
+    # Queries are clamped to the coverage built from the data; the index never grows per request
+    low, high = index.clamp(request.visible_low), index.clamp(request.visible_high)
+    min_scale = request.min_scale or index.auto_min_scale(low, high)
+    try:
+        levels = index.levels_between(low, high, min_scale)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}. Use a larger min_scale or a narrower range.")
+    return {
+        "levels": levels,
+        "nearest": index.nearest(request.current_price, min_scale),
+        "min_scale": min_scale
+    }
+
 @app.get("/spin", response_model=SpinResponse)
-async def spin_wheel():
-    if df is None:
-        raise HTTPException(status_code=500, detail="Data not loaded")
+async def spin_wheel(symbol: str = DEFAULT_SYMBOL, timeframe: str = DEFAULT_TIMEFRAME):
+    spin_series = require_series(symbol, timeframe)
+
+    # Use random_slice to get past data (visible) and future data (hidden for reveal)
+    past, future = spin_series.random_slice(past=200, future=50)
+    return {"past_data": past, "future_data": future}
 
-    # Use get_random_slice to get past data (visible) and future data (hidden for reveal)
-    past, future = get_random_slice(df, past=200, future=50)
+@app.get("/latest", response_model=SpinResponse)
+async def latest(n: int = 1000, symbol: str = DEFAULT_SYMBOL, timeframe: str = DEFAULT_TIMEFRAME):
+    past, future = require_series(symbol, timeframe).latest_slice(n)
     return {"past_data": past, "future_data": future}
 
+@app.post("/candles", response_model=AppendCandlesResponse, dependencies=[Depends(require_admin)])
+async def append_candles(request: AppendCandlesRequest):
+    """Append live bars; every worker sees them on its next read."""
+    series = require_series(request.symbol, request.timeframe)
+    bars = np.array(
+        [(c.time, c.open, c.high, c.low, c.close, c.volume) for c in request.candles],
+        dtype=BAR_DTYPE
+    )
+
+    # A bar far in the future would block every real bar behind it, so cap how far ahead it may be
+    if len(bars) and len(series):
+        horizon = max(int(series.column("time")[-1]), int(time.time())) + MAX_CANDLE_LEAD * series.bar_interval()
+        if bars["time"].max() > horizon:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Candle time {int(bars['time'].max())} is more than {MAX_CANDLE_LEAD} bars past the latest bar"
+            )
+    return await asyncio.to_thread(store.append, request.symbol, request.timeframe, bars)
+
 @app.post("/compile_strategy")
 async def api_compile_strategy(file: UploadFile = File(...)):
     content = await file.read()
@@ -114,51 +329,14 @@ async def api_compile_strategy(file: UploadFile = File(...)):
 
 @app.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(request: AnalyzeRequest):
-    # Mode A: Goldbach (Only when explicitly set)
-    if request.strategy_persona == "GOLDBACH_MODE":
-        # Run mathematical Goldbach analysis first
-        goldbach_result = run_goldbach_analysis(request.chart_data)
-
-        # If we have a screenshot, enhance with AI vision analysis
-        if request.chart_screenshot:
-            ai_enhanced = analyze_chart_with_goldbach(
-                request.chart_data,
-                goldbach_result,
-                request.chart_screenshot
-            )
-            return {
-                "sentiment": ai_enhanced.get("sentiment", goldbach_result.get("sentiment", "NEUTRAL")),
-                "narrative": ai_enhanced.get("narrative", goldbach_result.get("narrative", "")),
-                "key_level": None,
-                "goldbach_levels": goldbach_result.get("levels_to_draw", []),
-                "dealing_range": goldbach_result.get("dealing_range"),
-                "current_status": goldbach_result.get("current_status"),
-                "signals": goldbach_result.get("signals")
-            }
-
-        # No screenshot - return pure mathematical analysis
-        return {
-            "sentiment": goldbach_result.get("sentiment", "NEUTRAL"),
-            "narrative": goldbach_result.get("narrative", "Goldbach Analysis Complete"),
-            "key_level": None,
-            "goldbach_levels": goldbach_result.get("levels_to_draw", []),
-            "dealing_range": goldbach_result.get("dealing_range"),
-            "current_status": goldbach_result.get("current_status"),
-            "signals": goldbach_result.get("signals")
-        }
-
-    # Mode B: AI Analysis with optional screenshot
-    # Use a generic persona if none provided
-    persona = request.strategy_persona or "You are a technical analyst. Analyze the chart for trends, support/resistance levels, and potential trade setups. Be concise and actionable."
-    ai_result = analyze_chart(request.chart_data, persona, request.chart_screenshot)
-    return {
-        "sentiment": ai_result.get("sentiment", "NEUTRAL"),
-        "narrative": ai_result.get("narrative", "Analysis complete."),
-        "key_level": ai_result.get("key_level"),
-        "goldbach_levels": [],
-        "reasoning": ai_result.get("reasoning"),
-        "confidence": ai_result.get("confidence")
-    }
+    return run_analysis(
+        request.chart_data,
+        request.strategy_persona,
+        request.chart_screenshot,
+        # Features for spin windows come from the series features, computed on first use
+        loaded_series(DEFAULT_SYMBOL, DEFAULT_TIMEFRAME)
+    )
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,226 @@
+"""
+Opt-in request profiling.
+
+Nothing here is installed unless EDGE_PROFILING=1 and EDGE_ADMIN_TOKEN are set,
+so a normal deployment pays nothing. When enabled, a request is profiled if it
+carries "X-Profile: cprofile" or "X-Profile: sample" together with a valid
+"X-Admin-Token", or if the next N requests were armed via POST /admin/profile.
+
+- cprofile: deterministic cProfile trace saved as .prof (pstats). Open it with
+  snakeviz or turn it into a flamegraph with flameprof.
+- sample: stack samples of the request's thread saved as .collapsed folded
+  stacks, readable by flamegraph.pl, inferno and speedscope.
+
+Endpoints run on the event loop thread, so either mode can also pick up other
+requests interleaved at await points; profile on a quiet worker when it matters.
+Profiles are written to EDGE_PROFILE_DIR so any worker can serve the download.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import secrets
+import fcntl
+import cProfile
+import threading
+from collections import Counter
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from auth import require_admin
+
+PROFILE_DIR = os.environ.get(
+    "EDGE_PROFILE_DIR", os.path.join(os.path.dirname(__file__), "data", ".cache", "profiles")
+)
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.001  # Seconds between stack samples
+MAX_PROFILES = 50  # Oldest profile files are deleted beyond this
+MAX_ARMED = 1000  # Most requests one POST /admin/profile can arm
+
+# Health probes are polled constantly and would eat armed slots
+_UNARMED_PATHS = ("/healthz", "/readyz")
+
+# Shared across workers: {"remaining": N, "mode": "..."} while armed
+_ARM_PATH = os.path.join(PROFILE_DIR, "armed.json")
+
+# Only one profiler can hook a thread at a time
+_active = threading.Lock()
+
+
+def _take_armed():
+    """
+    Consumes one armed request slot across all workers; returns its mode or None.
+    """
+    if not os.path.exists(_ARM_PATH):
+        return None
+    with open(_ARM_PATH + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(_ARM_PATH, "r") as f:
+                armed = json.load(f)
+        except (OSError, ValueError):
+            return None
+        armed["remaining"] -= 1
+        if armed["remaining"] <= 0:
+            os.remove(_ARM_PATH)
+        else:
+            with open(_ARM_PATH, "w") as f:
+                json.dump(armed, f)
+        return armed["mode"] if armed["remaining"] >= 0 else None
+
+
+class _Sampler:
+    """
+    Samples one thread's Python stack on a background thread into folded-stack counts.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # Sample before waiting so even a request shorter than the interval shows up
+        while True:
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+            if self._stop.wait(SAMPLE_INTERVAL):
+                break
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.counts.items():
+                f.write(f"{stack} {count}\n")
+
+
+def _prune():
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith((".prof", ".collapsed"))),
+        key=os.path.getmtime
+    )
+    for path in files[:-MAX_PROFILES]:
+        os.remove(path)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware so unprofiled requests only pay for a header lookup
+    and one stat of the arm file.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.token = os.environ.get("EDGE_ADMIN_TOKEN", "").encode()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    def _requested_mode(self, scope):
+        headers = dict(scope.get("headers") or [])
+        mode = headers.get(b"x-profile")
+        if mode is not None and secrets.compare_digest(headers.get(b"x-admin-token", b""), self.token):
+            mode = mode.decode().lower()
+            return mode if mode in MODES else "cprofile"
+        # CORS preflights, health probes and admin calls (arming, downloads) never use up an armed slot
+        path = scope["path"]
+        if scope["method"] == "OPTIONS" or path in _UNARMED_PATHS or path.startswith("/admin"):
+            return None
+        return _take_armed()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        mode = self._requested_mode(scope)
+        if mode is None or not _active.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        slug = scope["path"].strip("/").replace("/", "_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}"
+        name += ".prof" if mode == "cprofile" else ".collapsed"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", name.encode())]
+            await send(message)
+
+        started = time.time()
+        try:
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, send_with_id)
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+            else:
+                sampler = _Sampler(threading.get_ident())
+                sampler.start()
+                try:
+                    await self.app(scope, receive, send_with_id)
+                finally:
+                    sampler.stop()
+                    sampler.dump(os.path.join(PROFILE_DIR, name))
+        finally:
+            _active.release()
+            _prune()
+            print(f"Profiled {scope['method']} {scope['path']} ({mode}, {time.time() - started:.3f}s): {name}")
+
+
+# --- Admin endpoints ---
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile")
+async def arm_profiling(count: int = Query(1, ge=1, le=MAX_ARMED), mode: str = "cprofile"):
+    """Profile the next `count` requests handled by any worker."""
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(MODES)}")
+    with open(_ARM_PATH + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        with open(_ARM_PATH, "w") as f:
+            json.dump({"remaining": count, "mode": mode}, f)
+    return {"armed": count, "mode": mode}
+
+
+@router.delete("/profile")
+async def disarm_profiling():
+    with open(_ARM_PATH + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(_ARM_PATH):
+            os.remove(_ARM_PATH)
+    return {"armed": 0}
+
+
+@router.get("/profiles")
+async def list_profiles():
+    names = [n for n in os.listdir(PROFILE_DIR) if n.endswith((".prof", ".collapsed"))]
+    names.sort(key=lambda n: os.path.getmtime(os.path.join(PROFILE_DIR, n)), reverse=True)
+    return {"profiles": [
+        {"id": n, "bytes": os.path.getsize(os.path.join(PROFILE_DIR, n))} for n in names
+    ]}
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    path = os.path.join(PROFILE_DIR, os.path.basename(profile_id))
+    if not profile_id.endswith((".prof", ".collapsed")) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path), media_type="application/octet-stream")
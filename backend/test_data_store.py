@@ -0,0 +1,125 @@
+import os
+
+import numpy as np
+import pytest
+
+import data_store
+from data_store import MarketDataStore, BAR_DTYPE
+
+HOUR = 3600
+BASE = 1167930000  # 04/01/2007 17:00:00 UTC
+
+CSV_LINES = [
+    "04/01/2007;17:00:00;1400.00;1402.76;1396.18;1399.08;40638\n",
+    "04/01/2007;18:00:00;1399.08;1400.56;1394.07;1398.30;7464\n",
+    "04/01/2007;19:00:00;1398.30;1400.21;1394.01;1394.09;45686\n",
+]
+NEXT_LINE = "04/01/2007;20:00:00;1394.09;1396.00;1393.50;1395.25;1200\n"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_store, "DATA_DIR", str(tmp_path))
+    with open(tmp_path / "es-1h.csv", "w") as f:
+        f.writelines(CSV_LINES)
+    return MarketDataStore(cache_dir=str(tmp_path / "cache"))
+
+
+def bars(*times):
+    return np.array([(t, 1.0, 2.0, 0.5, 1.5, 10.0) for t in times], dtype=BAR_DTYPE)
+
+
+def csv_path(tmp_path):
+    return str(tmp_path / "es-1h.csv")
+
+
+def test_append_new_bars(store):
+    result = store.append("es", "1h", bars(BASE + 3 * HOUR, BASE + 4 * HOUR))
+    assert result == {"appended": 2, "duplicates": 0, "rejected": 0, "total": 5}
+    assert list(store.get("es", "1h").column("time")[-2:]) == [BASE + 3 * HOUR, BASE + 4 * HOUR]
+
+
+def test_append_skips_known_bars(store):
+    result = store.append("es", "1h", bars(BASE + HOUR, BASE + 2 * HOUR, BASE + 3 * HOUR))
+    assert result == {"appended": 1, "duplicates": 2, "rejected": 0, "total": 4}
+    # The stored bar is kept, not overwritten by the resent one
+    assert store.get("es", "1h").column("close")[2] == 1394.09
+
+
+def test_append_rejects_stale_bars(store):
+    # Between two existing bars but not equal to either: cannot be inserted in place
+    result = store.append("es", "1h", bars(BASE + HOUR // 2, BASE + 3 * HOUR))
+    assert result == {"appended": 1, "duplicates": 0, "rejected": 1, "total": 4}
+
+
+def test_append_dedups_within_batch(store):
+    batch = bars(BASE + 4 * HOUR, BASE + 3 * HOUR, BASE + 4 * HOUR)
+    batch["close"] = [7.0, 8.0, 9.0]
+    result = store.append("es", "1h", batch)
+    assert result == {"appended": 2, "duplicates": 1, "rejected": 0, "total": 5}
+    series = store.get("es", "1h")
+    assert list(series.column("time")[-2:]) == [BASE + 3 * HOUR, BASE + 4 * HOUR]
+    # First occurrence in the batch wins
+    assert series.column("close")[-1] == 7.0
+
+
+def test_tail_consumes_only_complete_lines(store, tmp_path):
+    store.get("es", "1h")
+    with open(csv_path(tmp_path), "a") as f:
+        f.write(NEXT_LINE[:20])
+    assert store.tail_source("es", "1h") == 0
+    assert len(store.get("es", "1h")) == 3
+
+    with open(csv_path(tmp_path), "a") as f:
+        f.write(NEXT_LINE[20:])
+    assert store.tail_source("es", "1h") == 1
+    series = store.get("es", "1h")
+    assert len(series) == 4
+    assert series.column("close")[-1] == 1395.25
+
+
+def test_grown_source_caught_up_on_attach(store, tmp_path):
+    store.get("es", "1h")
+    with open(csv_path(tmp_path), "a") as f:
+        f.write(NEXT_LINE)
+
+    # A new process (no tailing) must still see the appended line
+    fresh = MarketDataStore(cache_dir=store.cache_dir)
+    assert len(fresh.get("es", "1h")) == 4
+
+
+def test_rewritten_source_is_rebuilt(store, tmp_path):
+    store.get("es", "1h")
+    # Larger than before, but the first line changed: not an append
+    with open(csv_path(tmp_path), "w") as f:
+        f.write(CSV_LINES[0].replace("1400.00", "1300.00"))
+        f.writelines(CSV_LINES[1:])
+        f.write(NEXT_LINE)
+
+    fresh = MarketDataStore(cache_dir=store.cache_dir)
+    series = fresh.get("es", "1h")
+    assert len(series) == 4
+    assert series.column("open")[0] == 1300.0
+
+
+def test_repeated_tails_of_small_source_never_rebuild(store, tmp_path):
+    series = store.get("es", "1h")
+    inode = os.stat(series.bin_path).st_ino
+    # A POSTed bar that a rebuild would silently drop
+    store.append("es", "1h", bars(BASE + 3 * HOUR))
+
+    for hour in (4, 5, 6):
+        with open(csv_path(tmp_path), "a") as f:
+            f.write(f"04/01/2007;{17 + hour}:00:00;1.00;2.00;0.50;1.50;10\n")
+        assert store.tail_source("es", "1h") == 1
+
+    assert os.stat(series.bin_path).st_ino == inode
+    assert len(store.get("es", "1h")) == 7
+
+
+def test_tail_skips_lines_behind_posted_bars(store, tmp_path, capsys):
+    store.append("es", "1h", bars(BASE + 5 * HOUR))
+    with open(csv_path(tmp_path), "a") as f:
+        f.write(NEXT_LINE)
+    assert store.tail_source("es", "1h") == 0
+    assert "skipped 1 lines" in capsys.readouterr().out
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from evaluate import PAST_BARS, FUTURE_BARS, draw_windows, score, open_checkpoint
+
+CONFIG = {"symbol": "es", "timeframe": "4h", "windows": 3, "seed": 1, "backend": "stub", "bars": 1000}
+
+
+def bar(close, high=None, low=None):
+    return {"close": close, "high": close if high is None else high, "low": close if low is None else low}
+
+
+def test_score_direction_and_pnl():
+    past, future = [bar(100)], [bar(104, high=106, low=99), bar(110)]
+    result = score({"sentiment": "bullish", "key_level": "105.5", "confidence": 70}, past, future, atr=2)
+    assert result == {
+        "predicted": "BULLISH", "actual": "BULLISH", "correct": True, "move": 10, "pnl": 10,
+        "key_level": 105.5, "key_level_hit": True, "confidence": 70,
+    }
+
+    result = score({"sentiment": "BEARISH", "key_level": 120}, past, future, atr=2)
+    assert (result["correct"], result["pnl"], result["key_level_hit"]) == (False, -10, False)
+
+
+def test_score_small_moves_are_neutral():
+    past, future = [bar(100)], [bar(101.9)]
+    assert score({"sentiment": "NEUTRAL"}, past, future, atr=2)["actual"] == "NEUTRAL"
+    assert score({"sentiment": "NEUTRAL"}, past, future, atr=2)["pnl"] == 0
+    assert score({"sentiment": "BULLISH"}, past, future, atr=1)["actual"] == "BULLISH"
+
+
+def test_score_without_usable_key_level():
+    past, future = [bar(100)], [bar(90)]
+    for key_level in (None, "n/a"):
+        result = score({"sentiment": "BEARISH", "key_level": key_level}, past, future, atr=2)
+        assert (result["key_level"], result["key_level_hit"]) == (None, None)
+
+
+def test_draw_windows_is_reproducible_and_in_range():
+    bars = 2000
+    starts = draw_windows(bars, 20, seed=3)
+    assert starts == draw_windows(bars, 20, seed=3)
+    assert starts != draw_windows(bars, 20, seed=4)
+    assert starts == sorted(set(starts)) and len(starts) == 20
+    assert all(0 <= s <= bars - PAST_BARS - FUTURE_BARS for s in starts)
+
+
+def test_draw_windows_caps_count_and_rejects_short_series():
+    total = PAST_BARS + FUTURE_BARS
+    assert draw_windows(total + 2, 50, seed=0) == [0, 1, 2]
+    with pytest.raises(ValueError):
+        draw_windows(total - 1, 1, seed=0)
+
+
+def test_checkpoint_resume_keeps_stored_config_and_results(tmp_path):
+    path = str(tmp_path / "run" / "checkpoint.jsonl")
+    config, done, f = open_checkpoint(path, CONFIG, fresh=False)
+    assert (config, done) == (CONFIG, {})
+    f.write(json.dumps({"type": "result", "key": "a:h:0", "correct": True}) + "\n")
+    # A record cut off by an interruption
+    f.write('{"type": "result", "key": "a:h:5"')
+    f.close()
+
+    # The series grew since, but the resumed run keeps the stored bar count
+    config, done, f = open_checkpoint(path, dict(CONFIG, bars=1200), fresh=False)
+    assert config == CONFIG
+    assert list(done) == ["a:h:0"]
+    f.write(json.dumps({"type": "result", "key": "a:h:7"}) + "\n")
+    f.close()
+
+    _, done, f = open_checkpoint(path, CONFIG, fresh=False)
+    f.close()
+    assert sorted(done) == ["a:h:0", "a:h:7"]
+
+
+@pytest.mark.parametrize("field, value", [("seed", 2), ("windows", 4), ("backend", "gemini"), ("symbol", "nq")])
+def test_checkpoint_refuses_mismatched_config(tmp_path, field, value):
+    path = str(tmp_path / "checkpoint.jsonl")
+    open_checkpoint(path, CONFIG, fresh=False)[2].close()
+    with pytest.raises(SystemExit, match=field):
+        open_checkpoint(path, dict(CONFIG, **{field: value}), fresh=False)
+
+    # --fresh starts over with the new config
+    config, done, f = open_checkpoint(path, dict(CONFIG, **{field: value}), fresh=True)
+    f.close()
+    assert config[field] == value and done == {}
+
+
+def test_checkpoint_without_header_is_refused(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    path.write_text(json.dumps({"type": "result", "key": "a:h:0"}) + "\n")
+    with pytest.raises(SystemExit, match="no config header"):
+        open_checkpoint(str(path), CONFIG, fresh=False)
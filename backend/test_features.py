@@ -0,0 +1,99 @@
+import time
+
+import numpy as np
+import pytest
+
+import data_store
+from data_store import MarketDataStore
+from features import SWING_SPAN, compute_features, window_digest, features_for_chart, chart_digest
+from goldbach import run_goldbach_analysis
+
+HOUR = 3600
+BASE = 1167930000  # 04/01/2007 17:00:00 UTC
+BARS = 300
+
+# Per-bar features that must only depend on bars <= i
+CAUSAL = (
+    "rolling_range", "range_high", "range_low", "atr", "last_swing_high", "last_swing_low",
+    "rolling_po3_size", "rolling_dr_position", "bullish_gap", "bearish_gap",
+)
+
+
+def random_walk(n=BARS, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 1400 + np.cumsum(rng.normal(0, 4, n))
+    open_ = np.concatenate(([1400.0], close[:-1]))
+    high = np.maximum(open_, close) + rng.uniform(0, 3, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 3, n)
+    return open_.round(2), high.round(2), low.round(2), close.round(2)
+
+
+@pytest.fixture
+def series(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_store, "DATA_DIR", str(tmp_path))
+    open_, high, low, close = random_walk()
+    with open(tmp_path / "es-1h.csv", "w") as f:
+        for i in range(BARS):
+            stamp = time.strftime("%d/%m/%Y;%H:%M:%S", time.gmtime(BASE + i * HOUR))
+            f.write(f"{stamp};{open_[i]:.2f};{high[i]:.2f};{low[i]:.2f};{close[i]:.2f};100\n")
+    return MarketDataStore(cache_dir=str(tmp_path / "cache")).get("es", "1h")
+
+
+def test_per_bar_features_are_causal():
+    _, high, low, close = random_walk()
+    full = compute_features(high, low, close)
+    for stop in (1, 5, 40, 150):
+        prefix = compute_features(high[:stop], low[:stop], close[:stop])
+        for name in CAUSAL:
+            np.testing.assert_array_equal(prefix[name], full[name][:stop], err_msg=name)
+
+
+def test_digest_ignores_bars_after_the_window():
+    _, high, low, close = random_walk()
+    full = compute_features(high, low, close)
+    for start, stop in ((0, 50), (100, 200), (250, 299)):
+        truncated = compute_features(high[:stop], low[:stop], close[:stop])
+        assert (
+            window_digest(full, high, low, close, start, stop)
+            == window_digest(truncated, high[:stop], low[:stop], close[:stop], start, stop)
+        )
+
+
+def test_digest_counts_only_confirmed_swings():
+    high = np.array([1, 2, 3, 4, 5, 6, 7, 8, 20, 7, 6, 5], dtype=np.float64)
+    low = high - 1
+    close = high - 0.5
+    features = compute_features(high, low, close)
+    assert features["swing_high"][8]
+
+    # The pivot at bar 8 needs SWING_SPAN later bars to be confirmed
+    unconfirmed = window_digest(features, high, low, close, 0, 8 + SWING_SPAN)
+    assert unconfirmed["swing_highs"] == 0
+    assert unconfirmed["last_swing_high"] is None
+
+    confirmed = window_digest(features, high, low, close, 0, 8 + SWING_SPAN + 1)
+    assert confirmed["swing_highs"] == 1
+    assert confirmed["last_swing_high"] == 20.0
+    assert confirmed["last_swing_high_bars_ago"] == SWING_SPAN
+
+
+def test_series_and_chart_paths_match_goldbach(series):
+    chart = series.records(120, 200)
+
+    _, _, start, stop = features_for_chart(chart, series)
+    assert (start, stop) == (120, 200)
+
+    edited = [dict(bar) for bar in chart]
+    edited[10]["close"] += 0.01
+    _, _, start, stop = features_for_chart(edited, series)
+    assert (start, stop) == (0, len(edited))
+
+    for bars in (chart, edited):
+        series_digest = chart_digest(bars, series)
+        chart_only = chart_digest(bars)
+        goldbach = run_goldbach_analysis(bars)["dealing_range"]
+        for digest in (series_digest, chart_only):
+            assert digest["po3_size"] == goldbach["po3_size"]
+            position = (bars[-1]["close"] - goldbach["low"]) / goldbach["po3_size"]
+            assert digest["dr_position"] == round(position, 2)
+        assert series_digest["window_range"] == chart_only["window_range"]
@@ -0,0 +1,65 @@
+import pytest
+
+from goldbach import PO3_SCALES
+from level_index import LevelIndex
+
+
+def test_nearest_tie_takes_lower_level():
+    index = LevelIndex(0, 100, scales=[100])
+    # Levels at 41 (0.41) and 50 (0.50); 45.5 is equidistant
+    assert index.nearest(45.5, 100)[100]["price"] == 41.0
+    assert index.nearest(45.51, 100)[100]["price"] == 50.0
+
+
+def test_nearest_outside_coverage_returns_edge_levels():
+    index = LevelIndex(0, 100, scales=[100])
+    assert (index.low, index.high) == (-100, 200)
+    assert index.nearest(-1e9, 100)[100]["price"] == -100.0
+    assert index.nearest(1e9, 100)[100]["price"] == 200.0
+
+
+def test_nearest_on_a_level_and_min_scale():
+    index = LevelIndex(5000, 5100)
+    nearest = index.nearest(5103.0, min_scale=27)
+    assert sorted(nearest) == [s for s in PO3_SCALES if s >= 27]
+    assert nearest[27]["price"] == 5103.0
+    assert nearest[27]["ratio"] == 0.0
+
+
+def test_levels_between_includes_both_bounds():
+    index = LevelIndex(0, 100, scales=[100])
+    prices = [level["price"] for level in index.levels_between(41, 59, 100)]
+    assert prices == [41.0, 50.0, 59.0]
+
+
+def test_levels_between_orders_shared_prices_coarser_first():
+    index = LevelIndex(0, 100)
+    levels = index.levels_between(0, 0, min_scale=9)
+    assert [level["price"] for level in levels] == [0.0] * 7
+    assert [level["scale"] for level in levels] == sorted((s for s in PO3_SCALES if s >= 9), reverse=True)
+
+    levels = index.levels_between(-10, 10, min_scale=3)
+    prices = [level["price"] for level in levels]
+    assert prices == sorted(prices)
+    assert all(level["scale"] >= 3 for level in levels)
+
+
+def test_levels_between_enforces_cap():
+    index = LevelIndex(0, 100)
+    assert index.count_between(0, 100, 3) == len(index.levels_between(0, 100, 3))
+    with pytest.raises(ValueError):
+        index.levels_between(0, 100, 3, max_levels=10)
+
+
+def test_auto_min_scale_picks_an_index_scale():
+    index = LevelIndex(0, 1000, scales=[10, 100, 1000])
+    assert index.auto_min_scale(0, 1000, 200) == 100
+    assert index.auto_min_scale(0, 1000, 50) == 1000
+    assert index.auto_min_scale(0, 1000, 1) == 1000
+    assert index.auto_min_scale(0, 1000, 10 ** 6) == 10
+
+    default = LevelIndex(5000, 5100)
+    scale = default.auto_min_scale(5000, 5100)
+    assert scale in PO3_SCALES
+    assert default.count_between(5000, 5100, scale) <= 500
+    assert default.count_between(5000, 5100, scale // 3) > 500
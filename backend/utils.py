@@ -26,7 +26,8 @@ def load_csv(file_path: str = DATA_PATH) -> pd.DataFrame:
     df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'], format='%d/%m/%Y %H:%M:%S')
     
     # Convert to unix timestamp for Lightweight Charts (seconds)
-    df['time'] = df['datetime'].astype('int64') // 10**9
+    # Go through datetime64[s] so the result doesn't depend on pandas' default resolution
+    df['time'] = df['datetime'].astype('datetime64[s]').astype('int64')
     
     # Drop duplicates based on time
     df = df.drop_duplicates(subset=['time'])